@@ -10,6 +10,9 @@ class DemoMomentumStrategy(QCAlgorithm):
     Demo momentum strategy using SMA crossover
     - Buys when fast SMA crosses above slow SMA
     - Sells when fast SMA crosses below slow SMA
+
+    SMAs are kept as running sums over rolling windows, so each bar costs
+    O(1) (add the new close, subtract the oldest) instead of O(period).
     """
 
     def Initialize(self):
@@ -24,9 +27,13 @@ class DemoMomentumStrategy(QCAlgorithm):
         # Add SPY (S&P 500 ETF) with daily resolution
         self.symbol = self.AddEquity("SPY", Resolution.Daily).Symbol
 
-        # Create moving average indicators
-        self.fast_sma = self.SMA(self.symbol, 20, Resolution.Daily)
-        self.slow_sma = self.SMA(self.symbol, 50, Resolution.Daily)
+        # Rolling windows of closes with running sums for the moving averages
+        self.fast_period = 20
+        self.slow_period = 50
+        self.fast_window = RollingWindow[float](self.fast_period)
+        self.slow_window = RollingWindow[float](self.slow_period)
+        self.fast_sum = 0.0
+        self.slow_sum = 0.0
 
         # Warm up period to initialize indicators
         self.SetWarmUp(50)
@@ -35,29 +42,44 @@ class DemoMomentumStrategy(QCAlgorithm):
 
     def OnData(self, data):
         """Execute trading logic on new data"""
-        # Skip if we're still warming up or indicators aren't ready
-        if self.IsWarmingUp or not self.fast_sma.IsReady or not self.slow_sma.IsReady:
+        # Skip if we don't have data for our symbol
+        if not data.Bars.ContainsKey(self.symbol):
             return
 
-        # Skip if we don't have data for our symbol
-        if not data.ContainsKey(self.symbol):
+        # Update running sums, including during warm up
+        price = float(data.Bars[self.symbol].Close)
+        self.fast_sum = self._update_window(self.fast_window, self.fast_sum, price)
+        self.slow_sum = self._update_window(self.slow_window, self.slow_sum, price)
+
+        # Skip if we're still warming up or averages aren't ready
+        if self.IsWarmingUp or not self.fast_window.IsReady or not self.slow_window.IsReady:
             return
 
+        fast_sma = self.fast_sum / self.fast_period
+        slow_sma = self.slow_sum / self.slow_period
+
         # Get current holdings
         holdings = self.Portfolio[self.symbol].Quantity
 
         # Trading logic: SMA Crossover
-        if self.fast_sma.Current.Value > self.slow_sma.Current.Value:
+        if fast_sma > slow_sma:
             # Bullish signal - buy if not already invested
             if holdings <= 0:
                 self.SetHoldings(self.symbol, 1.0)  # Invest 100% of portfolio
-                self.Debug(f"BUY: Fast SMA ({self.fast_sma.Current.Value:.2f}) > Slow SMA ({self.slow_sma.Current.Value:.2f})")
+                self.Debug(f"BUY: Fast SMA ({fast_sma:.2f}) > Slow SMA ({slow_sma:.2f})")
 
-        elif self.fast_sma.Current.Value < self.slow_sma.Current.Value:
+        elif fast_sma < slow_sma:
             # Bearish signal - sell if currently invested
             if holdings > 0:
                 self.Liquidate(self.symbol)
-                self.Debug(f"SELL: Fast SMA ({self.fast_sma.Current.Value:.2f}) < Slow SMA ({self.slow_sma.Current.Value:.2f})")
+                self.Debug(f"SELL: Fast SMA ({fast_sma:.2f}) < Slow SMA ({slow_sma:.2f})")
+
+    def _update_window(self, window, total, price):
+        """Add a close to a rolling window and return its updated running sum"""
+        if window.IsReady:
+            total -= window[window.Size - 1]
+        window.Add(price)
+        return total + price
 
     def OnEndOfAlgorithm(self):
         """Called at the end of the backtest"""
@@ -4,16 +4,10 @@ Interactive Streamlit UI for optimizing trading strategy rebate parameters using
 """
 
 import streamlit as st
-import pandas as pd
 import numpy as np
 import optuna
-from optuna.visualization import (
-    plot_optimization_history,
-    plot_param_importances,
-    plot_parallel_coordinate
-)
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+
+from simulation import TRADING_DAYS, simulate_moments
 
 
 # Configure Streamlit page
@@ -36,6 +30,8 @@ with st.sidebar:
         ["Single Rebate", "Multi-Asset Rebate", "Dynamic Rebate"]
     )
 
+    sampler_name = st.selectbox("Sampler", ["CMA-ES", "TPE", "Random"])
+
     n_trials = st.slider("Number of Trials", 10, 500, 100)
 
     st.divider()
@@ -46,55 +42,236 @@ with st.sidebar:
     risk_tolerance = st.slider("Risk Tolerance", 0.0, 1.0, 0.5, 0.1)
 
 
+# Simulation settings
+MONTH_DAYS = 21  # Trials report an intermediate Sharpe ratio every month
+STARTUP_TRIALS = 5  # Independent samples before the sampler starts learning
+BATCH_SIZE = 7  # Trials asked together afterwards; the CMA-ES population for 3 params
+SEED = 42
+TOP_TRIALS = 50  # Rows shown in the trial data table
+CACHE_ENTRIES = 16  # Results kept per cached helper; the caches are shared by all sessions
+
+
 # Simulate trading performance with rebates
-def simulate_trading_performance(rebate_pct, maker_taker_ratio, volume, frequency):
+def simulate_trading_performance(rebate_pct, maker_taker_ratio, frequency, seeds, start, mean, m2, days=MONTH_DAYS):
     """
-    Simulate trading performance with given rebate parameters
+    Simulate trading performance for a batch of rebate parameter vectors
 
-    Returns: Sharpe ratio (higher is better)
-    """
-    # Base returns simulation
-    daily_returns = np.random.normal(0.001, 0.02, 252)
+    Each trial draws its own seeded stream of daily returns inside a Numba
+    kernel, so no (N, days) returns matrix or temporaries are materialized.
 
-    # Transaction costs
-    base_cost = 0.001  # 0.1% base transaction cost
-    maker_rebate = rebate_pct / 100 * maker_taker_ratio
-    taker_cost = base_cost * (1 - maker_taker_ratio)
+    Returns: Updated (mean, m2) running moments of the cost-adjusted daily returns
+    """
+    mean = np.array(mean, dtype=np.float64)
+    m2 = np.array(m2, dtype=np.float64)
+
+    simulate_moments(
+        np.ascontiguousarray(rebate_pct, dtype=np.float64),
+        np.ascontiguousarray(maker_taker_ratio, dtype=np.float64),
+        float(frequency),
+        np.ascontiguousarray(seeds, dtype=np.uint32),
+        days,
+        start,
+        mean,
+        m2
+    )
+    return mean, m2
 
-    net_cost = taker_cost - maker_rebate
 
-    # Apply costs based on trading frequency
-    cost_drag = net_cost * frequency / 252
-    adjusted_returns = daily_returns - cost_drag
+def sharpe_ratio(mean, m2, days, rebate_pct, maker_taker_ratio):
+    """
+    Annualized Sharpe ratio from running moments of daily returns
 
-    # Calculate Sharpe ratio
-    sharpe = np.mean(adjusted_returns) / np.std(adjusted_returns) * np.sqrt(252)
+    Returns: Array of Sharpe ratios, one per trial (higher is better)
+    """
+    sharpe = mean / np.sqrt(m2 / days) * np.sqrt(TRADING_DAYS)
 
     # Penalize for extreme parameters
-    if rebate_pct > 5.0 or maker_taker_ratio > 0.9:
-        sharpe *= 0.8
+    return np.where((rebate_pct > 5.0) | (maker_taker_ratio > 0.9), sharpe * 0.8, sharpe)
+
+
+def suggest_params(trial):
+    """Suggest rebate parameters for an Optuna trial"""
+    return (
+        trial.suggest_float("rebate_percentage", 0.0, 10.0),
+        trial.suggest_float("maker_taker_ratio", 0.0, 1.0),
+        trial.suggest_float("position_size_pct", 0.1, 1.0),
+    )
+
+
+def create_sampler(name):
+    """Create the Optuna sampler selected in the sidebar"""
+    if name == "CMA-ES":
+        # Three bounded continuous parameters with no conditional structure
+        return optuna.samplers.CmaEsSampler(
+            seed=SEED,
+            n_startup_trials=STARTUP_TRIALS,
+            popsize=BATCH_SIZE,
+            warn_independent_sampling=False,
+            consider_pruned_trials=True  # Most trials are pruned early
+        )
+    if name == "TPE":
+        return optuna.samplers.TPESampler(seed=SEED, n_startup_trials=STARTUP_TRIALS)
+    return optuna.samplers.RandomSampler(seed=SEED)
+
+
+def trial_seeds(number):
+    """
+    Per-month kernel seeds for a trial, derived from the trial number
+
+    Keeps each trial's simulated returns independent of batching and of
+    which other trials were pruned.
+    """
+    return np.random.SeedSequence(SEED, spawn_key=(number,)).generate_state(TRADING_DAYS // MONTH_DAYS)
+
+
+def run_optimization(n_trials, frequency, sampler_name="CMA-ES", batch_size=BATCH_SIZE):
+    """
+    Maximize Sharpe ratio with Optuna's ask/tell interface
+
+    The startup trials are asked as one batch, then trials are asked in
+    sampler-sized batches so every batch after the first is sampled from
+    what the study has learned. Each batch is simulated one month at a time
+    by the parallel Numba kernel. After every month the running Sharpe ratio is
+    reported and trials ranked out by successive halving stop early.
+    """
+    study = optuna.create_study(
+        direction="maximize",
+        sampler=create_sampler(sampler_name),
+        pruner=optuna.pruners.SuccessiveHalvingPruner(min_resource=MONTH_DAYS, reduction_factor=3)
+    )
+
+    remaining = n_trials
+    next_batch = STARTUP_TRIALS
+    while remaining > 0:
+        trials = [study.ask() for _ in range(min(next_batch, remaining))]
+        next_batch = batch_size
+        params = np.array([suggest_params(trial) for trial in trials])
+        seeds = np.array([trial_seeds(trial.number) for trial in trials])
+        mean = np.zeros(len(trials))
+        m2 = np.zeros(len(trials))
+
+        active = np.arange(len(trials))
+        for days in range(MONTH_DAYS, TRADING_DAYS + 1, MONTH_DAYS):
+            mean[active], m2[active] = simulate_trading_performance(
+                params[active, 0],
+                params[active, 1],
+                frequency,
+                seeds[active, days // MONTH_DAYS - 1],
+                days - MONTH_DAYS,
+                mean[active],
+                m2[active]
+            )
+
+            sharpe = sharpe_ratio(mean[active], m2[active], days, params[active, 0], params[active, 1])
 
-    return sharpe
+            survivors = []
+            for idx, value in zip(active, sharpe):
+                trial = trials[idx]
+                if days == TRADING_DAYS:
+                    study.tell(trial, float(value))
+                    continue
 
+                trial.report(float(value), days)
+                if trial.should_prune():
+                    study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+                else:
+                    survivors.append(idx)
 
-# Optuna objective function
-def objective(trial):
-    """Optuna objective to maximize Sharpe ratio"""
+            active = np.array(survivors, dtype=int)
+            if not active.size:
+                break
 
-    # Suggest parameters
-    rebate_pct = trial.suggest_float("rebate_percentage", 0.0, 10.0)
-    maker_taker_ratio = trial.suggest_float("maker_taker_ratio", 0.0, 1.0)
-    position_size = trial.suggest_float("position_size_pct", 0.1, 1.0)
+        remaining -= len(trials)
 
-    # Simulate performance
-    sharpe = simulate_trading_performance(
-        rebate_pct,
-        maker_taker_ratio,
-        base_volume * position_size,
-        trading_frequency
+    return study
+
+
+def study_key(study):
+    """Cache key identifying a study by its trial numbers and values"""
+    return hash(tuple((trial.number, trial.value) for trial in study.trials))
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def trials_table(_study, study_hash):
+    """All trials of a study indexed by trial number"""
+    return _study.trials_dataframe().set_index("number")
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def trials_csv(_study, study_hash):
+    """CSV export of all trials, serialized once per study"""
+    return trials_table(_study, study_hash).to_csv().encode()
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def derived_results(_study, study_hash, volume, frequency):
+    """
+    Best parameters and estimated annual savings of a study
+
+    Cached on the study key and inputs, so widget reruns reuse the results
+    until a new optimization runs or the strategy parameters change.
+    """
+    trials = trials_table(_study, study_hash)
+    best = trials.loc[_study.best_trial.number]
+    params = {
+        column[len("params_"):]: value
+        for column, value in best.items() if column.startswith("params_")
+    }
+
+    # Calculate estimated savings
+    annual_savings = (
+        params['rebate_percentage'] / 100 *
+        volume *
+        frequency * TRADING_DAYS *
+        params['maker_taker_ratio']
     )
 
-    return sharpe
+    return params, best["value"], annual_savings
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def top_trials(_study, study_hash, n=TOP_TRIALS):
+    """
+    Highest-value completed trials with only the columns shown in the trial table
+
+    Pruned trials keep their last intermediate Sharpe ratio, which covers only
+    part of the year, so they are left out of the ranking.
+    """
+    trials_df = _study.trials_dataframe(attrs=("number", "value", "params", "state"))
+    trials_df = trials_df[trials_df["state"] == optuna.trial.TrialState.COMPLETE.name]
+    return trials_df[[
+        "number",
+        "value",
+        "params_rebate_percentage",
+        "params_maker_taker_ratio",
+        "params_position_size_pct",
+        "state"
+    ]].nlargest(n, "value")
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def history_figure(_study, study_hash):
+    """Optimization history plot, rebuilt only when the study changes"""
+    # Visualization helpers pull in plotly, so import them only once a study exists
+    from optuna.visualization import plot_optimization_history
+
+    return plot_optimization_history(_study)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def importance_figure(_study, study_hash):
+    """Parameter importance plot; memoized as the fANOVA evaluation is costly"""
+    from optuna.visualization import plot_param_importances
+
+    return plot_param_importances(_study)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES)
+def parallel_coordinate_figure(_study, study_hash):
+    """Parallel coordinate plot, rebuilt only when the study changes"""
+    from optuna.visualization import plot_parallel_coordinate
+
+    return plot_parallel_coordinate(_study)
 
 
 # Main content area
@@ -106,41 +283,39 @@ with col1:
     if st.button("🚀 Run Optimization", type="primary"):
         with st.spinner(f"Running {n_trials} optimization trials..."):
             # Create and run Optuna study
-            study = optuna.create_study(
-                direction="maximize",
-                sampler=optuna.samplers.TPESampler(seed=42)
-            )
-
-            study.optimize(objective, n_trials=n_trials, show_progress_bar=False)
+            study = run_optimization(n_trials, trading_frequency, sampler_name)
 
             # Store in session state
             st.session_state.study = study
-            st.session_state.best_params = study.best_params
-            st.session_state.best_value = study.best_value
+            st.session_state.study_hash = study_key(study)
 
         st.success("Optimization complete!")
 
 with col2:
     st.subheader("📊 Best Parameters")
 
-    if "best_params" in st.session_state:
-        params = st.session_state.best_params
-        value = st.session_state.best_value
+    if "study" in st.session_state:
+        params, value, annual_savings = derived_results(
+            st.session_state.study,
+            st.session_state.study_hash,
+            base_volume,
+            trading_frequency
+        )
+
+        completed = len(st.session_state.study.get_trials(
+            deepcopy=False,
+            states=(optuna.trial.TrialState.COMPLETE,)
+        ))
 
         st.metric("Best Sharpe Ratio", f"{value:.4f}")
+        st.metric("Completed Trials", f"{completed} / {len(st.session_state.study.trials)}")
+        st.caption("Pruned trials stop before the full year and are excluded from the best result")
         st.divider()
 
         st.metric("Optimal Rebate %", f"{params['rebate_percentage']:.2f}%")
         st.metric("Maker/Taker Ratio", f"{params['maker_taker_ratio']:.2%}")
         st.metric("Position Size", f"{params['position_size_pct']:.2%}")
 
-        # Calculate estimated savings
-        annual_savings = (
-            params['rebate_percentage'] / 100 *
-            base_volume *
-            trading_frequency * 252 *
-            params['maker_taker_ratio']
-        )
         st.metric("Estimated Annual Savings", f"${annual_savings:,.0f}")
 
 
@@ -156,10 +331,11 @@ if "study" in st.session_state:
     ])
 
     study = st.session_state.study
+    study_hash = st.session_state.study_hash
 
     with tab1:
         st.plotly_chart(
-            plot_optimization_history(study),
+            history_figure(study, study_hash),
             use_container_width=True
         )
         st.caption("Shows how the objective value improves over trials")
@@ -167,7 +343,7 @@ if "study" in st.session_state:
     with tab2:
         try:
             st.plotly_chart(
-                plot_param_importances(study),
+                importance_figure(study, study_hash),
                 use_container_width=True
             )
             st.caption("Indicates which parameters have the most impact on performance")
@@ -176,29 +352,21 @@ if "study" in st.session_state:
 
     with tab3:
         st.plotly_chart(
-            plot_parallel_coordinate(study),
+            parallel_coordinate_figure(study, study_hash),
             use_container_width=True
         )
         st.caption("Visualizes relationships between parameters and objective value")
 
     with tab4:
-        # Create trials dataframe
-        trials_df = study.trials_dataframe()
         st.dataframe(
-            trials_df[[
-                "number",
-                "value",
-                "params_rebate_percentage",
-                "params_maker_taker_ratio",
-                "params_position_size_pct",
-                "state"
-            ]].sort_values("value", ascending=False),
+            top_trials(study, study_hash),
             use_container_width=True
         )
+        st.caption("Top completed trials; the CSV export also includes pruned trials")
 
         st.download_button(
             "📥 Download Trial Data",
-            trials_df.to_csv(index=False),
+            trials_csv(study, study_hash),
             "optimization_results.csv",
             "text/csv"
         )
@@ -0,0 +1,59 @@
+"""
+Rebate Simulation Kernel
+Numba-compiled Monte Carlo kernel for the rebate optimization sandbox
+
+Kept out of app.py so Numba's on-disk cache can re-import this module
+without re-running the Streamlit script.
+"""
+
+import numpy as np
+from numba import config, njit, prange
+
+
+# Streamlit runs each session's script on its own thread, so parallel
+# regions need a thread-safe backend (OpenMP or TBB), not workqueue
+config.THREADING_LAYER = "threadsafe"
+
+TRADING_DAYS = 252
+BASE_COST = 0.001  # 0.1% base transaction cost
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def simulate_moments(rebate_pct, maker_taker_ratio, frequency, seeds, days, start, mean, m2):
+    """
+    Fused returns simulation and Welford update, parallel across trials
+
+    Continues each trial's running mean / sum of squared deviations (mean, m2)
+    from `start` days for another `days` days, in place.
+    """
+    for i in prange(rebate_pct.size):
+        np.random.seed(seeds[i])
+
+        # Transaction costs applied based on trading frequency
+        maker_rebate = rebate_pct[i] / 100 * maker_taker_ratio[i]
+        taker_cost = BASE_COST * (1 - maker_taker_ratio[i])
+        cost_drag = (taker_cost - maker_rebate) * frequency / TRADING_DAYS
+
+        trial_mean = mean[i]
+        trial_m2 = m2[i]
+        for day in range(days):
+            daily_return = np.random.normal(0.001, 0.02) - cost_drag
+            delta = daily_return - trial_mean
+            trial_mean += delta / (start + day + 1)
+            trial_m2 += delta * (daily_return - trial_mean)
+
+        mean[i] = trial_mean
+        m2[i] = trial_m2
+
+
+# Compile (or load the cached kernel) at import so the first optimization doesn't pay for it
+simulate_moments(
+    np.zeros(1),
+    np.zeros(1),
+    1.0,
+    np.zeros(1, dtype=np.uint32),
+    1,
+    0,
+    np.zeros(1),
+    np.zeros(1)
+)
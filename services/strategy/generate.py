@@ -4,45 +4,33 @@ Generates and validates QuantConnect Lean trading strategies using AI
 """
 
 import os
+import re
 import sys
+import ast
 import json
-import subprocess
+import asyncio
+import tempfile
+from string import Template
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime
 
 try:
-    from anthropic import Anthropic
+    from anthropic import APIError, AsyncAnthropic, DefaultAsyncHttpxClient
 except ImportError:
     print("Warning: anthropic library not installed. Using mock mode.")
-    Anthropic = None
+    AsyncAnthropic = None
 
 
-class StrategyGenerator:
-    """Generates trading strategies using AI and validates them"""
-
-    def __init__(self, api_key: Optional[str] = None):
-        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
-        self.client = Anthropic(api_key=self.api_key) if Anthropic and self.api_key else None
-        self.output_dir = Path("/app/generated")
-        self.output_dir.mkdir(exist_ok=True)
+# QuantConnect markers located in a single pass over the strategy source
+_PY_IMPORT_TOKENS = re.compile("|".join(map(re.escape, ("AlgorithmImports", "QCAlgorithm"))))
+_CS_REQUIRED_TOKENS = re.compile("|".join(map(re.escape, ("QCAlgorithm", "Initialize()"))))
 
-    def generate_strategy(self, prompt: str, language: str = "python") -> Dict[str, str]:
-        """
-        Generate a trading strategy based on a natural language prompt
-
-        Args:
-            prompt: Description of the trading strategy to generate
-            language: Programming language (python or csharp)
-
-        Returns:
-            Dictionary with 'code' and 'description' keys
-        """
-        if not self.client:
-            return self._generate_mock_strategy(prompt, language)
 
-        system_prompt = f"""You are an expert QuantConnect Lean trading strategy developer.
-Generate clean, production-ready {language} trading strategies that follow QuantConnect best practices.
+# Prompt templates for the API; the system prompt is identical for every
+# request in a language, so it is marked cacheable on the server side
+_SYSTEM_TEMPLATE = Template("""You are an expert QuantConnect Lean trading strategy developer.
+Generate clean, production-ready $language trading strategies that follow QuantConnect best practices.
 
 Include:
 - Proper initialization and configuration
@@ -51,52 +39,36 @@ Include:
 - Performance tracking
 - Error handling
 
-The strategy should be complete and runnable in the QuantConnect Lean engine."""
+The strategy should be complete and runnable in the QuantConnect Lean engine.""")
 
-        user_prompt = f"""Generate a QuantConnect Lean trading strategy in {language} based on this description:
+_USER_TEMPLATE = Template("""Generate a QuantConnect Lean trading strategy in $language based on this description:
 
-{prompt}
+$prompt
 
-Provide only the code without explanation."""
+Provide only the code without explanation.""")
 
-        try:
-            message = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=4096,
-                messages=[{
-                    "role": "user",
-                    "content": user_prompt
-                }],
-                system=system_prompt
-            )
 
-            code = message.content[0].text
+def _system_prompt(language: str) -> List[Dict]:
+    """Build the cacheable system prompt content blocks for a language"""
+    return [{
+        "type": "text",
+        "text": _SYSTEM_TEMPLATE.substitute(language=language),
+        "cache_control": {"type": "ephemeral"}
+    }]
 
-            # Clean up code blocks if present
-            if "```" in code:
-                code = code.split("```")[1]
-                if code.startswith("python") or code.startswith("csharp"):
-                    code = "\n".join(code.split("\n")[1:])
 
-            return {
-                "code": code.strip(),
-                "description": prompt,
-                "language": language,
-                "timestamp": datetime.now().isoformat()
-            }
-        except Exception as e:
-            print(f"Error generating strategy: {e}")
-            return self._generate_mock_strategy(prompt, language)
+_SYSTEM_PY = _system_prompt("python")
+_SYSTEM_CS = _system_prompt("csharp")
+_SYSTEM_PROMPTS = {"python": _SYSTEM_PY, "csharp": _SYSTEM_CS}
 
-    def _generate_mock_strategy(self, prompt: str, language: str) -> Dict[str, str]:
-        """Generate a simple mock strategy for testing"""
-        if language == "python":
-            code = '''from AlgorithmImports import *
+
+# Mock strategy templates used when no API client is available
+_PY_TEMPLATE = Template('''from AlgorithmImports import *
 
 class GeneratedStrategy(QCAlgorithm):
     """
     Auto-generated trading strategy
-    Description: {description}
+    Description: $description
     """
 
     def Initialize(self):
@@ -107,50 +79,167 @@ class GeneratedStrategy(QCAlgorithm):
         # Add equity
         self.symbol = self.AddEquity("SPY", Resolution.Daily).Symbol
 
-        # Set up indicators
-        self.sma_fast = self.SMA(self.symbol, 20, Resolution.Daily)
-        self.sma_slow = self.SMA(self.symbol, 50, Resolution.Daily)
+        # Rolling windows of closes with running sums for O(1) SMAs
+        self.fast_window = RollingWindow[float](20)
+        self.slow_window = RollingWindow[float](50)
+        self.fast_sum = 0.0
+        self.slow_sum = 0.0
 
     def OnData(self, data):
-        if not self.sma_fast.IsReady or not self.sma_slow.IsReady:
+        if not data.Bars.ContainsKey(self.symbol):
+            return
+
+        price = float(data.Bars[self.symbol].Close)
+        self.fast_sum = self._update_window(self.fast_window, self.fast_sum, price)
+        self.slow_sum = self._update_window(self.slow_window, self.slow_sum, price)
+
+        if not self.fast_window.IsReady or not self.slow_window.IsReady:
             return
 
         # Simple moving average crossover strategy
-        if self.sma_fast.Current.Value > self.sma_slow.Current.Value:
+        if self.fast_sum / 20 > self.slow_sum / 50:
             if not self.Portfolio[self.symbol].Invested:
                 self.SetHoldings(self.symbol, 1.0)
         else:
             if self.Portfolio[self.symbol].Invested:
                 self.Liquidate(self.symbol)
-'''.format(description=prompt)
-        else:
-            code = f'''// Auto-generated C# strategy
-// Description: {prompt}
+
+    def _update_window(self, window, total, price):
+        # Subtract the close falling out of the window, add the new one
+        if window.IsReady:
+            total -= window[window.Size - 1]
+        window.Add(price)
+        return total + price
+''')
+
+_CS_TEMPLATE = Template('''// Auto-generated C# strategy
+// Description: $description
 
 namespace QuantConnect.Algorithm.CSharp
-{{
+{
     public class GeneratedStrategy : QCAlgorithm
-    {{
+    {
         private Symbol _symbol;
 
         public override void Initialize()
-        {{
+        {
             SetStartDate(2023, 1, 1);
             SetEndDate(2024, 1, 1);
             SetCash(100000);
 
             _symbol = AddEquity("SPY", Resolution.Daily).Symbol;
-        }}
+        }
 
         public override void OnData(Slice data)
-        {{
+        {
             if (!Portfolio[_symbol].Invested)
-            {{
+            {
                 SetHoldings(_symbol, 1.0);
-            }}
-        }}
-    }}
-}}'''
+            }
+        }
+    }
+}''')
+
+
+class StrategyGenerator:
+    """
+    Generates trading strategies using AI and validates them
+
+    Use `async with generator:` to share one pooled HTTP/2 API client across
+    concurrent requests. That client is bound to the event loop it was opened
+    in and is closed on exit; outside such a block each call opens and closes
+    its own client, so separate asyncio.run() calls are safe.
+    """
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+        self.client = None
+        self.output_dir = Path("/app/generated")
+        self.output_dir.mkdir(exist_ok=True)
+
+    async def __aenter__(self) -> "StrategyGenerator":
+        if AsyncAnthropic and self.api_key:
+            self.client = self._open_client()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    def _open_client(self) -> "AsyncAnthropic":
+        """Create an API client with a pooled HTTP/2 connection"""
+        return AsyncAnthropic(
+            api_key=self.api_key,
+            http_client=DefaultAsyncHttpxClient(http2=True)
+        )
+
+    async def generate_strategy(self, prompt: str, language: str = "python") -> Dict[str, str]:
+        """
+        Generate a trading strategy based on a natural language prompt
+
+        Args:
+            prompt: Description of the trading strategy to generate
+            language: Programming language (python or csharp)
+
+        Returns:
+            Dictionary with 'code' and 'description' keys
+
+        Raises:
+            APIError: If the API cannot be reached or rejects the request
+        """
+        if not (AsyncAnthropic and self.api_key):
+            return self._generate_mock_strategy(prompt, language)
+
+        if self.client:
+            return await self._request_strategy(self.client, prompt, language)
+
+        async with self._open_client() as client:
+            return await self._request_strategy(client, prompt, language)
+
+    async def _request_strategy(self, client: "AsyncAnthropic", prompt: str, language: str) -> Dict[str, str]:
+        """Stream a strategy from the API; API errors propagate to the caller"""
+        user_prompt = _USER_TEMPLATE.substitute(language=language, prompt=prompt)
+
+        try:
+            async with client.messages.stream(
+                model="claude-sonnet-4-20250514",
+                max_tokens=4096,
+                messages=[{
+                    "role": "user",
+                    "content": user_prompt
+                }],
+                system=_SYSTEM_PROMPTS.get(language) or _system_prompt(language)
+            ) as stream:
+                code = "".join([text async for text in stream.text_stream])
+
+            # Clean up code blocks if present
+            _, fence, tail = code.partition("```")
+            if fence:
+                code = tail.partition("```")[0]
+                first_nl = code.find("\n")
+                if first_nl < 0:
+                    first_nl = len(code)
+                if code[:first_nl].startswith(("python", "csharp")):
+                    code = code[first_nl + 1:]
+
+            return {
+                "code": code.strip(),
+                "description": prompt,
+                "language": language,
+                "timestamp": datetime.now().isoformat()
+            }
+        except APIError:
+            # A mock here would pass for a real strategy, so fail visibly
+            raise
+        except Exception as e:
+            print(f"Error generating strategy: {e}")
+            return self._generate_mock_strategy(prompt, language)
+
+    def _generate_mock_strategy(self, prompt: str, language: str) -> Dict[str, str]:
+        """Generate a simple mock strategy for testing"""
+        template = _PY_TEMPLATE if language == "python" else _CS_TEMPLATE
+        code = template.substitute(description=prompt)
 
         return {
             "code": code,
@@ -161,7 +250,7 @@ namespace QuantConnect.Algorithm.CSharp
 
     def validate_strategy(self, code: str, language: str) -> Dict[str, any]:
         """
-        Validate strategy code using linting and basic checks
+        Validate strategy code using syntax and structural checks
 
         Args:
             code: Strategy code to validate
@@ -180,43 +269,40 @@ namespace QuantConnect.Algorithm.CSharp
         # Basic validation checks
         if language == "python":
             # Check for required imports
-            if "AlgorithmImports" not in code and "QCAlgorithm" not in code:
+            if not _PY_IMPORT_TOKENS.search(code):
                 results["errors"].append("Missing QuantConnect imports")
                 results["valid"] = False
 
-            # Check for required methods
-            if "def Initialize(" not in code:
+            # Check syntax and required methods in-process
+            try:
+                tree = ast.parse(code)
+            except SyntaxError as e:
+                # Method checks would only add false reports for unparseable code
+                results["errors"].append(f"Syntax: {e}")
+                results["valid"] = False
+                return results
+
+            methods = {
+                node.name for node in ast.walk(tree)
+                if isinstance(node, ast.FunctionDef)
+            }
+
+            if "Initialize" not in methods:
                 results["errors"].append("Missing Initialize method")
                 results["valid"] = False
 
-            if "def OnData(" not in code:
+            if "OnData" not in methods:
                 results["warnings"].append("Missing OnData method")
                 results["score"] -= 20
 
-            # Try pylint if available
-            temp_file = self.output_dir / "temp_validate.py"
-            try:
-                temp_file.write_text(code)
-                result = subprocess.run(
-                    ["pylint", str(temp_file), "--score=yes"],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                if result.returncode != 0:
-                    results["warnings"].append("Linting issues found")
-            except Exception:
-                pass
-            finally:
-                if temp_file.exists():
-                    temp_file.unlink()
-
         elif language == "csharp":
-            if "QCAlgorithm" not in code:
+            found = set(_CS_REQUIRED_TOKENS.findall(code))
+
+            if "QCAlgorithm" not in found:
                 results["errors"].append("Missing QCAlgorithm base class")
                 results["valid"] = False
 
-            if "Initialize()" not in code:
+            if "Initialize()" not in found:
                 results["errors"].append("Missing Initialize method")
                 results["valid"] = False
 
@@ -227,19 +313,40 @@ namespace QuantConnect.Algorithm.CSharp
         ext = "py" if strategy["language"] == "python" else "cs"
         filepath = self.output_dir / f"{filename}.{ext}"
 
-        filepath.write_text(strategy["code"])
-
-        # Save metadata
-        meta_path = self.output_dir / f"{filename}.json"
-        meta_path.write_text(json.dumps({
+        metadata = json.dumps({
             "description": strategy["description"],
             "language": strategy["language"],
             "timestamp": strategy["timestamp"],
             "filename": str(filepath)
-        }, indent=2))
+        }, indent=2).encode()
+
+        # Publish code before metadata so a metadata file implies complete code
+        self._write_atomic(filepath, strategy["code"].encode())
+        self._write_atomic(self.output_dir / f"{filename}.json", metadata)
 
         return filepath
 
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        """Write to a temp file beside path and swap it in, so readers never see a partial file"""
+        fd, temp_path = tempfile.mkstemp(dir=self.output_dir, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # mkstemp creates owner-only files; keep them readable like write_bytes did
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+async def _generate_all(generator: StrategyGenerator, prompts: List[str]) -> List:
+    """Generate strategies for all prompts concurrently over one shared client"""
+    async with generator:
+        return await asyncio.gather(*(
+            generator.generate_strategy(prompt, language="python") for prompt in prompts
+        ), return_exceptions=True)
+
 
 def main():
     """Main entry point for strategy generator"""
@@ -257,17 +364,26 @@ def main():
     ]
 
     for i, prompt in enumerate(prompts, 1):
-        print(f"\n[{i}/{len(prompts)}] Generating: {prompt}")
+        print(f"[{i}/{len(prompts)}] Generating: {prompt}")
+
+    # Keep all API requests in flight at once
+    strategies = asyncio.run(_generate_all(generator, prompts))
+
+    for i, (prompt, strategy) in enumerate(zip(prompts, strategies), 1):
+        print(f"\n[{i}/{len(prompts)}] {prompt}")
+
+        if isinstance(strategy, Exception):
+            print(f" Generation failed: {strategy}")
+            continue
 
-        strategy = generator.generate_strategy(prompt, language="python")
         validation = generator.validate_strategy(strategy["code"], strategy["language"])
 
         if validation["valid"]:
             filepath = generator.save_strategy(strategy, f"strategy_{i}")
-            print(f" Generated and saved to: {filepath}")
+            print(f" Generated and saved to: {filepath}")
             print(f"  Validation score: {validation['score']}/100")
         else:
-            print(f" Validation failed:")
+            print(f" Validation failed:")
             for error in validation["errors"]:
                 print(f"  - {error}")
 